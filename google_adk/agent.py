@@ -10,20 +10,29 @@ from google.adk.a2a.utils.agent_to_a2a import to_a2a
 from google.genai import types
 from google.adk.models.lite_llm import LiteLlm
 from dotenv import load_dotenv
+import ast
+import operator
 import os
+import sys
 import logging
+from functools import lru_cache
+from types import MappingProxyType
 from fastapi import Request
 from opentelemetry import trace
-from opentelemetry.context import set_value, attach
+from opentelemetry.context import set_value, attach, detach
+from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.exporter.otlp.proto.http import Compression
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 
 # Import custom OpenTelemetry components
 from utils.otel_exporter import (
     TraceModifyingSpanProcessor,
-    ModifyingSpanExporter,
+    build_batch_span_processor,
+    compile_filter_patterns,
+    static_resource_attributes,
 )
+from utils.request_metadata import extract_thread_id
 
 load_dotenv()
 
@@ -34,7 +43,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 otel_logger = logging.getLogger("opentelemetry")
-otel_logger.setLevel(logging.DEBUG)  # Enable detailed OTEL logging
+# Detailed OTEL logging adds synchronous I/O to every export; opt in with OTEL_DEBUG=1
+otel_logger.setLevel(logging.DEBUG if os.getenv("OTEL_DEBUG") else logging.WARNING)
 
 # Configure OpenTelemetry tracing directly to LangSmith
 # Project name can be overridden via LANGSMITH_PROJECT environment variable
@@ -63,23 +73,19 @@ if env_headers:
     logger.info("Using OTEL_EXPORTER_OTLP_HEADERS from environment")
     # Parse headers from environment variable
     # Format: "key1=value1,key2=value2" or "key1: value1,key2: value2"
-    for header_pair in env_headers.split(","):
-        header_pair = header_pair.strip()
-        if "=" in header_pair:
-            key, value = header_pair.split("=", 1)
-            headers[key.strip()] = value.strip()
-            # Don't log the full API key value
-            if "api" in key.lower() and "key" in key.lower():
-                logger.info(f"  Header: {key.strip()}=***")
-            else:
-                logger.info(f"  Header: {key.strip()}={value.strip()}")
-        elif ":" in header_pair:
-            key, value = header_pair.split(":", 1)
-            headers[key.strip()] = value.strip()
-            if "api" in key.lower() and "key" in key.lower():
-                logger.info(f"  Header: {key.strip()}=***")
-            else:
-                logger.info(f"  Header: {key.strip()}={value.strip()}")
+    headers = {
+        key.strip(): value.strip()
+        for key, _, value in (
+            header_pair.partition("=" if "=" in header_pair else ":")
+            for header_pair in env_headers.split(",")
+            if "=" in header_pair or ":" in header_pair
+        )
+    }
+    for key, value in headers.items():
+        # Don't log the full API key value
+        if "api" in key.lower() and "key" in key.lower():
+            value = "***"
+        logger.info(f"  Header: {key}={value}")
 else:
     logger.info("Using individual environment variables (LANGSMITH_API_KEY, LANGSMITH_PROJECT)")
     # Fall back to individual environment variables if OTEL_EXPORTER_OTLP_HEADERS not set
@@ -98,42 +104,115 @@ if not headers:
     logger.error("  - OTEL_EXPORTER_OTLP_HEADERS='x-api-key=YOUR_KEY,Langsmith-Project=YOUR_PROJECT'")
     logger.error("  - OR set LANGSMITH_API_KEY and LANGSMITH_PROJECT environment variables")
 
+# Freeze the headers so they can't be mutated once handed to the exporter
+headers = MappingProxyType({sys.intern(k): v for k, v in headers.items()}) if headers else None
+
+# Compress export payloads - LLM prompts/outputs in span attributes compress well
+# OTEL_EXPORTER_OTLP_TRACES_COMPRESSION / OTEL_EXPORTER_OTLP_COMPRESSION take precedence
+compression = None
+if not (
+    os.getenv("OTEL_EXPORTER_OTLP_TRACES_COMPRESSION")
+    or os.getenv("OTEL_EXPORTER_OTLP_COMPRESSION")
+):
+    compression = Compression.Gzip
+
 # Create the OTLP exporter for LangSmith
 logger.info("Creating OTLPSpanExporter...")
 otlp_exporter = OTLPSpanExporter(
     endpoint=langsmith_endpoint,
-    headers=headers if headers else None,
+    headers=headers,
     timeout=10,
+    compression=compression,
 )
 
 # Configure span filtering patterns from environment variable
 # Format: comma-separated regex patterns, e.g., "a2a\.server.*,a2a\.utils.*,EventQueue\..*"
 # Default: Filter out a2a.server and a2a.utils spans
 filter_patterns_str = os.getenv("OTEL_SPAN_FILTER_PATTERNS", "a2a\\.server.*,a2a\\.utils.*")
-filter_patterns_list = [p.strip() for p in filter_patterns_str.split(",") if p.strip()]
-
-# Wrap the exporter with our custom modifying exporter
-# This allows us to filter or log traces before they are sent to LangSmith
-# The exporter will compile the pattern strings internally
-logger.info("Wrapping exporter with ModifyingSpanExporter...")
-modifying_exporter = ModifyingSpanExporter(otlp_exporter, filter_patterns=filter_patterns_list)
+# Compile once at import; invalid patterns are logged and skipped
+filter_patterns_compiled = compile_filter_patterns(
+    [p.strip() for p in filter_patterns_str.split(",") if p.strip()]
+)
 
 # Set up the TracerProvider with our custom processor and exporter
+# Environment and service version live on the resource; per-span attributes are
+# added by the modifying processor and per-request ones by the middleware below
 logger.info("Setting up TracerProvider with TraceModifyingSpanProcessor and BatchSpanProcessor...")
-tracer_provider = TracerProvider()
+resource = Resource.create(static_resource_attributes())
+tracer_provider = TracerProvider(resource=resource)
 
-# Add the modifying span processor FIRST (modifies spans when they end)
+# Add the modifying span processor FIRST (adds custom.processor, agent.type and
+# duration_ms when spans end)
 modifying_processor = TraceModifyingSpanProcessor()
 tracer_provider.add_span_processor(modifying_processor)
 
-# Add the batch processor with our modifying exporter SECOND (exports to LangSmith)
-batch_processor = BatchSpanProcessor(modifying_exporter)
+# Add the batch processor that exports to LangSmith SECOND
+# The modifying exporter filters or logs traces before they are sent, unioning the
+# precompiled patterns and caching decisions per span name; batches upload in
+# parallel so a slow endpoint doesn't back up the queue
+batch_processor = build_batch_span_processor(
+    otlp_exporter,
+    filter_patterns=filter_patterns_compiled,
+    filter_cache_size=int(os.getenv("OTEL_SPAN_FILTER_CACHE_SIZE", "2048")),
+    max_concurrent_exports=int(os.getenv("OTEL_SPAN_MAX_CONCURRENT_EXPORTS", "4")),
+)
 tracer_provider.add_span_processor(batch_processor)
 
 trace.set_tracer_provider(tracer_provider)
+tracer = trace.get_tracer(__name__)
 logger.info("OpenTelemetry configuration complete!")
 logger.info("=" * 60)
 
+# Whitelisted operators and functions for the calculator tool
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+_ALLOWED_FUNCTIONS = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sum": sum,
+    "pow": pow,
+}
+
+
+@lru_cache(maxsize=512)
+def _parse_expression(expression: str) -> ast.expr:
+    """Parse an expression once; repeated expressions reuse the cached tree."""
+    return ast.parse(expression.strip(), mode="eval").body
+
+
+def _evaluate(node: ast.expr):
+    """Evaluate a parsed expression, allowing only whitelisted operations."""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        return _BINARY_OPERATORS[type(node.op)](_evaluate(node.left), _evaluate(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_evaluate(element) for element in node.elts]
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in _ALLOWED_FUNCTIONS
+        and not node.keywords
+    ):
+        return _ALLOWED_FUNCTIONS[node.func.id](*(_evaluate(arg) for arg in node.args))
+    raise ValueError(f"unsupported expression element '{type(node).__name__}'")
+
+
 def calculate(expression: str) -> str:
     """Evaluate a mathematical expression safely.
 
@@ -144,17 +223,8 @@ def calculate(expression: str) -> str:
         A string with the result of the calculation or an error message.
     """
     try:
-        # Use eval with a restricted namespace for basic math operations
-        allowed_names = {
-            "__builtins__": {},
-            "abs": abs,
-            "round": round,
-            "min": min,
-            "max": max,
-            "sum": sum,
-            "pow": pow,
-        }
-        result = eval(expression, allowed_names)
+        # Walk the parsed expression instead of eval so only basic math is allowed
+        result = _evaluate(_parse_expression(expression))
         return f"The result is: {result}"
     except Exception as e:
         return f"Error calculating expression: {str(e)}"
@@ -197,23 +267,7 @@ a2a_app = to_a2a(root_agent, port=8002)
 @a2a_app.middleware("http")
 async def set_thread_id_middleware(request: Request, call_next):
     """Extract session_id from metadata and set as thread_id in OpenTelemetry spans."""
-    tracer = trace.get_tracer(__name__)
-    
-    thread_id = None
-    if request.method == "POST":
-        try:
-            body_bytes = await request.body()
-            if body_bytes:
-                import json
-                body = json.loads(body_bytes)
-                if "metadata" in body:
-                    thread_id = body["metadata"].get("thread_id")
-                async def receive():
-                    return {"type": "http.request", "body": body_bytes}
-                request._receive = receive
-        except:
-            pass
-    
+    thread_id = await extract_thread_id(request)
     if thread_id:
         ctx = set_value("thread_id", thread_id)
         token = attach(ctx)
@@ -221,18 +275,21 @@ async def set_thread_id_middleware(request: Request, call_next):
         token = None
     
     try:
-        logger.info(f"Creating span 'google_adk_agent' for {request.method} {request.url.path}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Creating span 'google_adk_agent' for {request.method} {request.url.path}")
         with tracer.start_as_current_span("google_adk_agent") as span:
-            logger.debug(f"Span created: trace_id={span.get_span_context().trace_id:x}, span_id={span.get_span_context().span_id:x}")
+            if logger.isEnabledFor(logging.DEBUG):
+                span_context = span.get_span_context()
+                logger.debug(f"Span created: trace_id={span_context.trace_id:x}, span_id={span_context.span_id:x}")
             if thread_id:
                 span.set_attribute("langsmith.metadata.thread_id", thread_id)
                 logger.info(f"Set thread_id attribute: {thread_id}")
             else:
                 logger.warning("No thread_id found in request metadata")
             response = await call_next(request)
-            logger.info(f"Request completed, span will be exported")
-            return response
+        # Log after the span has ended so logging I/O isn't counted in its duration
+        logger.debug("Request completed, span will be exported")
+        return response
     finally:
         if token:
-            from opentelemetry.context import detach
             detach(token)
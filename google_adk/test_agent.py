@@ -9,6 +9,17 @@ import asyncio
 import aiohttp
 import json
 
+try:
+    import orjson
+
+    def json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    json_loads = orjson.loads
+except ImportError:
+    json_dumps = json.dumps
+    json_loads = json.loads
+
 
 async def test_endpoint(session, url, question, test_num):
     """Test a specific endpoint with a question."""
@@ -34,16 +45,11 @@ async def test_endpoint(session, url, question, test_num):
             headers={"Accept": "application/json", "Content-Type": "application/json"}
         ) as response:
             if response.status == 200:
-                result = await response.json()
-                # Extract the response text
-                if "result" in result and "artifacts" in result["result"]:
-                    artifacts = result["result"]["artifacts"]
-                    if artifacts and "parts" in artifacts[0]:
-                        text = artifacts[0]["parts"][0].get("text", "")
-                        return True, text
-                    else:
-                        return True, json.dumps(result, indent=2)
-                else:
+                result = json_loads(await response.read())
+                # Extract the response text, only pretty-printing unexpected payloads
+                try:
+                    return True, result["result"]["artifacts"][0]["parts"][0]["text"]
+                except (KeyError, IndexError, TypeError):
                     return True, json.dumps(result, indent=2)
             else:
                 text = await response.text()
@@ -64,22 +70,36 @@ async def test_agent():
     print("Testing Google ADK Calculator Agent")
     print("=" * 60)
     
-    async with aiohttp.ClientSession() as session:
-        for i, question in enumerate(test_cases, 1):
-            print(f"\n--- Test {i} ---")
-            print(f"Question: {question}")
-            success, result = await test_endpoint(session, url, question, i)
-            if success:
-                print(f"✅ Response: {result}")
-            else:
-                print(f"❌ Error: {result}")
-                # If we get an error, try to parse it for debugging
-                try:
-                    error_data = json.loads(result.split("Error")[-1] if "Error" in result else result)
-                    if isinstance(error_data, dict) and "error" in error_data:
-                        print(f"   Error details: {error_data['error'].get('message', 'Unknown error')}")
-                except:
-                    pass
+    # Keep DNS results and connections alive across all test requests
+    connector = aiohttp.TCPConnector(
+        limit=100,
+        limit_per_host=32,
+        ttl_dns_cache=300,
+        keepalive_timeout=75,
+    )
+    async with aiohttp.ClientSession(
+        connector=connector,
+        json_serialize=json_dumps,
+    ) as session:
+        # The questions are independent, so send them all at once
+        results = await asyncio.gather(
+            *(test_endpoint(session, url, question, i) for i, question in enumerate(test_cases, 1))
+        )
+    
+    for i, (question, (success, result)) in enumerate(zip(test_cases, results), 1):
+        print(f"\n--- Test {i} ---")
+        print(f"Question: {question}")
+        if success:
+            print(f"✅ Response: {result}")
+        else:
+            print(f"❌ Error: {result}")
+            # If we get an error, try to parse it for debugging
+            try:
+                error_data = json.loads(result.split("Error")[-1] if "Error" in result else result)
+                if isinstance(error_data, dict) and "error" in error_data:
+                    print(f"   Error details: {error_data['error'].get('message', 'Unknown error')}")
+            except:
+                pass
 
 
 if __name__ == "__main__":
@@ -12,7 +12,7 @@ from typing import Any, Dict
 
 from dotenv import load_dotenv
 from langchain.agents import create_agent
-from langchain.agents.middleware import AgentState, before_model, after_model
+from langchain.agents.middleware import AgentState, before_model
 from langchain_openai import ChatOpenAI
 from langgraph.runtime import Runtime
 
@@ -37,6 +37,16 @@ system_prompt = (
 )
 
 
+def _to_message_dict(msg: Any) -> Dict[str, Any] | None:
+    """Return a role/content dict for a message object, or None if it needs no conversion."""
+    if type(msg) is dict:
+        return None
+    try:
+        return {"role": msg.role, "content": msg.content}
+    except AttributeError:
+        return None
+
+
 # Middleware for handling A2A message format conversion
 @before_model
 def convert_a2a_messages(state: AgentState, runtime: Runtime) -> Dict[str, Any] | None:
@@ -46,50 +56,22 @@ def convert_a2a_messages(state: AgentState, runtime: Runtime) -> Dict[str, Any]
     """
     messages = state.get("messages", [])
     
-    # Convert A2A format (dict with role/content) to LangChain format if needed
-    converted_messages = []
-    for msg in messages:
-        if isinstance(msg, dict):
-            # Already in dict format, keep as is
-            converted_messages.append(msg)
-        elif hasattr(msg, "role") and hasattr(msg, "content"):
-            # Convert message object to dict
-            converted_messages.append({
-                "role": msg.role,
-                "content": msg.content
-            })
-        else:
-            # Keep original format
-            converted_messages.append(msg)
-    
-    if converted_messages != messages:
-        return {"messages": converted_messages}
-    return None
-
-
-@after_model
-def ensure_response_format(state: AgentState, runtime: Runtime) -> Dict[str, Any] | None:
-    """Ensure the response is in the correct format for A2A protocol.
-    
-    This middleware ensures the last message has the correct structure.
-    """
-    messages = state.get("messages", [])
-    if not messages:
+    # Fast path: find the first message that needs converting, if any
+    for first_index, msg in enumerate(messages):
+        converted = _to_message_dict(msg)
+        if converted is not None:
+            break
+    else:
         return None
     
-    last_message = messages[-1]
-    
-    # Ensure the last message is in dict format for A2A compatibility
-    if not isinstance(last_message, dict):
-        if hasattr(last_message, "role") and hasattr(last_message, "content"):
-            # Convert to dict format
-            new_messages = messages[:-1] + [{
-                "role": last_message.role,
-                "content": last_message.content if hasattr(last_message, "content") else str(last_message)
-            }]
-            return {"messages": new_messages}
+    # Keep the untouched prefix and convert message objects from there on;
+    # dicts and objects without role/content are kept as is
+    converted_messages = messages[:first_index]
+    converted_messages.append(converted)
+    for msg in messages[first_index + 1:]:
+        converted_messages.append(_to_message_dict(msg) or msg)
     
-    return None
+    return {"messages": converted_messages}
 
 
 # Create the agent using LangChain v1's create_agent directly
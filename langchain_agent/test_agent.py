@@ -7,22 +7,71 @@ Run this script after starting the agent server with:
 
 import asyncio
 import aiohttp
+import json
 import uuid
 import os
 import sys
 from dotenv import load_dotenv
 
+try:
+    import orjson
+
+    def json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    json_loads = orjson.loads
+except ImportError:
+    json_dumps = json.dumps
+    json_loads = json.loads
+
 load_dotenv(override=True)
 
 
+async def send_question(session, url, question):
+    """Send a single question to the agent and return its thread ID and printable result."""
+    # Each question gets its own thread so concurrent requests don't share thread state
+    thread_id = str(uuid.uuid4())
+    session_id = thread_id  # Use same ID for session tracking
+    
+    payload = {
+        "jsonrpc": "2.0",
+        "id": str(uuid.uuid4()),
+        "method": "message/send",
+        "params": {
+            "message": {
+                "role": "user",
+                "parts": [{"kind": "text", "text": question}]
+            },
+            "messageId": str(uuid.uuid4()),
+            "thread": {"threadId": thread_id}
+        },
+        "metadata": {"session_id": session_id}
+    }
+    
+    headers = {"Accept": "application/json", "Content-Type": "application/json"}
+    try:
+        async with session.post(url, json=payload, headers=headers) as response:
+            if response.status == 200:
+                result = json_loads(await response.read())
+                if "result" in result and "artifacts" in result["result"]:
+                    artifacts = result["result"]["artifacts"]
+                    if artifacts and len(artifacts) > 0:
+                        if "parts" in artifacts[0] and len(artifacts[0]["parts"]) > 0:
+                            text = artifacts[0]["parts"][0].get("text", "")
+                            return thread_id, f"✅ Response: {text}"
+                        return thread_id, f"⚠️  Unexpected response format: {result}"
+                    return thread_id, f"⚠️  No artifacts in response: {result}"
+                return thread_id, f"⚠️  Unexpected response: {result}"
+            text = await response.text()
+            return thread_id, f"❌ Error {response.status}: {text[:200]}"
+    except Exception as e:
+        return thread_id, f"❌ Exception: {e}"
+
+
 async def test_agent(assistant_id, port=2024):
     """Test the LangChain agent via A2A protocol."""
     url = f"http://127.0.0.1:{port}/a2a/{assistant_id}"
     
-    # Generate a consistent thread ID for this test session
-    thread_id = str(uuid.uuid4())
-    session_id = thread_id  # Use same ID for session tracking
-    
     test_cases = [
         "Hello! Can you help me with fluid dynamics?",
         "What is a simplified Navier-Stokes equation?",
@@ -32,55 +81,31 @@ async def test_agent(assistant_id, port=2024):
     print("Testing LangChain Agent")
     print("=" * 60)
     print(f"Agent URL: {url}")
-    print(f"Thread ID: {thread_id}")
-    print(f"Session ID: {session_id}")
     print("=" * 60)
     print()
     
-    async with aiohttp.ClientSession() as session:
-        for i, question in enumerate(test_cases, 1):
-            print(f"--- Test {i} ---")
-            print(f"Question: {question}")
-            
-            payload = {
-                "jsonrpc": "2.0",
-                "id": str(uuid.uuid4()),
-                "method": "message/send",
-                "params": {
-                    "message": {
-                        "role": "user",
-                        "parts": [{"kind": "text", "text": question}]
-                    },
-                    "messageId": str(uuid.uuid4()),
-                    "thread": {"threadId": thread_id}
-                },
-                "metadata": {"session_id": session_id}
-            }
-            
-            headers = {"Accept": "application/json", "Content-Type": "application/json"}
-            try:
-                async with session.post(url, json=payload, headers=headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if "result" in result and "artifacts" in result["result"]:
-                            artifacts = result["result"]["artifacts"]
-                            if artifacts and len(artifacts) > 0:
-                                if "parts" in artifacts[0] and len(artifacts[0]["parts"]) > 0:
-                                    text = artifacts[0]["parts"][0].get("text", "")
-                                    print(f"✅ Response: {text}")
-                                else:
-                                    print(f"⚠️  Unexpected response format: {result}")
-                            else:
-                                print(f"⚠️  No artifacts in response: {result}")
-                        else:
-                            print(f"⚠️  Unexpected response: {result}")
-                    else:
-                        text = await response.text()
-                        print(f"❌ Error {response.status}: {text[:200]}")
-            except Exception as e:
-                print(f"❌ Exception: {e}")
-            
-            print()
+    # Keep DNS results and connections alive across all test requests
+    connector = aiohttp.TCPConnector(
+        limit=100,
+        limit_per_host=32,
+        ttl_dns_cache=300,
+        keepalive_timeout=75,
+    )
+    async with aiohttp.ClientSession(
+        connector=connector,
+        json_serialize=json_dumps,
+    ) as session:
+        # The questions are independent, so send them all at once
+        results = await asyncio.gather(
+            *(send_question(session, url, question) for question in test_cases)
+        )
+    
+    for i, (question, (thread_id, result)) in enumerate(zip(test_cases, results), 1):
+        print(f"--- Test {i} ---")
+        print(f"Thread ID: {thread_id}")
+        print(f"Question: {question}")
+        print(result)
+        print()
 
 
 def main():
@@ -5,9 +5,11 @@ Supports the A2A protocol with messages input for conversational interactions.
 
 from __future__ import annotations
 
+import operator
 import os
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Annotated, Any, Dict, List
 
 from typing_extensions import TypedDict
 
@@ -19,6 +21,22 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+@lru_cache(maxsize=None)
+def _get_client() -> AsyncOpenAI:
+    """Return the shared OpenAI client, creating it on first use.
+
+    The client is shared so connections are reused across graph invocations. It is
+    created lazily so a missing API key fails the call instead of loading the graph.
+    """
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=2, timeout=30.0)
+
+
+_SYSTEM_MESSAGES = ({
+    "role": "system",
+    "content": "You are a helpful conversational agent specialized in fluid dynamics. Your main task is to calculate simplified versions of the Navier-Stokes equations. You will communicate with an expert mathematics professor who has mathematical tools available to help with calculations. When you need to perform mathematical computations, delegate them to the mathematics professor. Keep responses brief and engaging, and focus on providing clear mathematical solutions when asked about fluid dynamics problems."
+},)
+
+
 class Context(TypedDict):
     """Context parameters for the agent."""
     my_configurable_param: str
@@ -29,30 +47,23 @@ class State:
     """Input state for the agent.
 
     Defines the initial structure for A2A conversational messages.
+    New messages returned by nodes are appended by the reducer.
     """
-    messages: List[Dict[str, Any]]
+    messages: Annotated[List[Dict[str, Any]], operator.add]
 
 
 async def call_model(state: State, runtime: Runtime[Context]) -> Dict[str, Any]:
     """Process conversational messages and returns output using OpenAI."""
-    # Initialize OpenAI client
-    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
     # Process the incoming messages
-    latest_message = state.messages[-1] if state.messages else {}
-    user_content = latest_message.get("content", "No message content")
+    if state.messages:
+        user_content = state.messages[-1].get("content", "No message content")
+    else:
+        user_content = "No message content"
 
     # Create messages for OpenAI API
-    openai_messages = [
-        {
-            "role": "system",
-            "content": "You are a helpful conversational agent specialized in fluid dynamics. Your main task is to calculate simplified versions of the Navier-Stokes equations. You will communicate with an expert mathematics professor who has mathematical tools available to help with calculations. When you need to perform mathematical computations, delegate them to the mathematics professor. Keep responses brief and engaging, and focus on providing clear mathematical solutions when asked about fluid dynamics problems."
-        },
-        {
-            "role": "user",
-            "content": user_content
-        }
-    ]
+    openai_messages = [*_SYSTEM_MESSAGES, {"role": "user", "content": user_content}]
+
+    client = _get_client()
 
     try:
         # Make OpenAI API call
@@ -75,7 +86,7 @@ async def call_model(state: State, runtime: Runtime[Context]) -> Dict[str, Any]:
     }
 
     return {
-        "messages": state.messages + [response_message]
+        "messages": [response_message]
     }
 
 
@@ -21,53 +21,80 @@ import sys
 import uuid
 from dotenv import load_dotenv
 
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    import json
+
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+    json_loads = json.loads
+
 load_dotenv(override=True)
 
+# Payloads are pre-serialized, so the content type is set explicitly
+JSON_HEADERS = {"Accept": "application/json", "Content-Type": "application/json"}
 
-async def send_to_langchain(session, assistant_id, text, thread_id, context_id=None, task_id=None):
-    """Send a message to LangChain agent using standard A2A format.
+
+def uuid4_batch(n):
+    """Generate n random (version 4) UUID strings from a single os.urandom call."""
+    buf = bytearray(os.urandom(16 * n))
+    ids = []
+    for i in range(0, 16 * n, 16):
+        buf[i + 6] = (buf[i + 6] & 0x0F) | 0x40  # version 4
+        buf[i + 8] = (buf[i + 8] & 0x3F) | 0x80  # RFC 4122 variant
+        h = buf[i:i + 16].hex()
+        ids.append(f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}")
+    return ids
+
+
+def build_message(text, message_id=None, context_id=None, task_id=None):
+    """Build an A2A user message object.
     
-    Uses contextId per A2A spec (3.4.2) for multi-turn conversation patterns.
-    contextId and taskId are included inside the message object (not at params level).
-    First message doesn't include contextId (server generates it).
-    Uses thread_id (context_id) in metadata to group traces in LangSmith.
+    contextId and taskId go inside the message for follow-up messages.
     """
-    url = f"http://127.0.0.1:2024/a2a/{assistant_id}"
-    
-    # Build message object - contextId and taskId go inside the message
     message = {
         "role": "user",
         "parts": [{"kind": "text", "text": text}],
-        "messageId": str(uuid.uuid4())
+        "messageId": message_id or str(uuid.uuid4())
     }
-    
-    # Add contextId and taskId inside message for follow-up messages
     if context_id:
         message["contextId"] = context_id
     if task_id:
         message["taskId"] = task_id
+    return message
+
+
+async def send_to_langchain(
+    session, assistant_id, text, thread_id, context_id=None, task_id=None,
+    request_id=None, message_id=None,
+):
+    """Send a message to LangChain agent using standard A2A format.
     
-    # Build params - messageId is also at params level for some implementations
-    params = {
-        "message": message,
-        "messageId": message["messageId"]
-    }
+    Uses contextId per A2A spec (3.4.2) for multi-turn conversation patterns.
+    contextId and taskId are included inside the message object (not at params level).
+    First message doesn't include contextId (server generates it).
+    Uses thread_id (context_id) in metadata to group traces in LangSmith.
+    request_id and message_id are generated when not provided.
+    """
+    url = f"http://127.0.0.1:2024/a2a/{assistant_id}"
     
+    message = build_message(text, message_id, context_id, task_id)
     payload = {
         "jsonrpc": "2.0",
-        "id": str(uuid.uuid4()),
+        "id": request_id or str(uuid.uuid4()),
         "method": "message/send",
-        "params": params,
-        "metadata": {
-            "thread_id": thread_id  # Use context_id as thread_id to group traces in same thread
-        }
+        # messageId is also at params level for some implementations
+        "params": {"message": message, "messageId": message["messageId"]},
+        # Use context_id as thread_id to group traces in same thread
+        "metadata": {"thread_id": thread_id},
     }
     
-    headers = {"Accept": "application/json"}
     try:
-        async with session.post(url, json=payload, headers=headers) as response:
+        async with session.post(url, data=json_dumps(payload), headers=JSON_HEADERS) as response:
             if response.status == 200:
-                result = await response.json()
+                result = json_loads(await response.read())
                 
                 if "error" in result:
                     return False, result["error"].get("message", "Unknown error"), None, None
@@ -88,7 +115,10 @@ async def send_to_langchain(session, assistant_id, text, thread_id, context_id=N
         return False, f"Exception: {str(e)}", None, None
 
 
-async def send_to_google_adk(session, text, thread_id, context_id=None, task_id=None):
+async def send_to_google_adk(
+    session, text, thread_id, context_id=None, task_id=None,
+    request_id=None, message_id=None,
+):
     """Send a message to Google ADK agent using to_a2a() format.
     
     Google ADK to_a2a() expects:
@@ -96,41 +126,23 @@ async def send_to_google_adk(session, text, thread_id, context_id=None, task_id=
     - contextId and taskId also inside the message object (per A2A spec)
     - First message doesn't include contextId (server generates it)
     - Uses thread_id (context_id) in metadata to group traces in LangSmith
+    - request_id and message_id are generated when not provided
     """
     url = "http://localhost:8002/"
     
-    # Build message object - contextId and taskId go inside the message
-    message = {
-        "role": "user",
-        "parts": [{"kind": "text", "text": text}],
-        "messageId": str(uuid.uuid4())
-    }
-    
-    # Add contextId and taskId inside message for follow-up messages
-    if context_id:
-        message["contextId"] = context_id
-    if task_id:
-        message["taskId"] = task_id
-    
-    params = {
-        "message": message
-    }
-    
     payload = {
         "jsonrpc": "2.0",
-        "id": str(uuid.uuid4()),
+        "id": request_id or str(uuid.uuid4()),
         "method": "message/send",
-        "params": params,
-        "metadata": {
-            "thread_id": thread_id  # Use context_id as thread_id to group traces in same thread
-        }
+        "params": {"message": build_message(text, message_id, context_id, task_id)},
+        # Use context_id as thread_id to group traces in same thread
+        "metadata": {"thread_id": thread_id},
     }
     
-    headers = {"Accept": "application/json"}
     try:
-        async with session.post(url, json=payload, headers=headers) as response:
+        async with session.post(url, data=json_dumps(payload), headers=JSON_HEADERS) as response:
             if response.status == 200:
-                result = await response.json()
+                result = json_loads(await response.read())
                 
                 if "error" in result:
                     return False, result["error"].get("message", "Unknown error"), None, None
@@ -173,9 +185,25 @@ async def simulate_conversation(langchain_assistant_id, num_rounds=5, initial_me
     langchain_task_id = None
     adk_task_id = None
     
+    # Generate request and message IDs for both agents up front (4 per round)
+    ids = iter(uuid4_batch(4 * num_rounds))
+    pacing = None
     
-    async with aiohttp.ClientSession() as session:
+    # Reuse keep-alive connections to both agents for every round
+    connector = aiohttp.TCPConnector(
+        limit=0,
+        limit_per_host=8,
+        ttl_dns_cache=300,
+        keepalive_timeout=75,
+    )
+    # Fail fast on connection problems, but keep aiohttp's default 5 minute total -
+    # a LangChain round includes a delegated LLM and ADK round trip
+    timeout = aiohttp.ClientTimeout(total=300, connect=5)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
         for i in range(num_rounds):
+            # Pace rounds at least 0.5s apart, overlapping the delay with the requests
+            pacing = asyncio.create_task(asyncio.sleep(0.5))
+            
             print(f"--- Round {i + 1} ---")
             if context_id:
                 print(f"📎 Context ID: {context_id}")
@@ -190,7 +218,8 @@ async def simulate_conversation(langchain_assistant_id, num_rounds=5, initial_me
             # LangChain agent responds
             print(f"📤 Sending to LangChain: {message[:60]}...")
             success, response, new_task_id, new_context_id = await send_to_langchain(
-                session, langchain_assistant_id, message, thread_id, context_id, None
+                session, langchain_assistant_id, message, thread_id, context_id, None,
+                request_id=next(ids), message_id=next(ids),
             )
             
             if success:
@@ -211,7 +240,8 @@ async def simulate_conversation(langchain_assistant_id, num_rounds=5, initial_me
             thread_id = context_id or shared_thread_id
             print(f"📤 Sending to Google ADK: {message[:60]}...")
             success, response, new_task_id, new_context_id = await send_to_google_adk(
-                session, message, thread_id, context_id, None
+                session, message, thread_id, context_id, None,
+                request_id=next(ids), message_id=next(ids),
             )
             
             if success:
@@ -230,8 +260,11 @@ async def simulate_conversation(langchain_assistant_id, num_rounds=5, initial_me
             print("-" * 70)
             print()
             
-            # Small delay between rounds
-            await asyncio.sleep(0.5)
+            await pacing
+    
+    if pacing:
+        # Stopped early on an error - don't leave the pacing timer pending
+        pacing.cancel()
     
     print("=" * 70)
     print("Conversation completed!")
@@ -4,18 +4,65 @@ This module provides custom OpenTelemetry components for:
 - Modifying span attributes before export
 - Filtering spans based on regex patterns
 - Restructuring traces by reparenting spans when parents are filtered
+- Exporting several span batches concurrently
 """
 
+import contextvars
 import os
 import re
 import logging
-from typing import Sequence, Dict, Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Callable, Sequence, Dict, Optional, Union
 
 from opentelemetry.sdk.trace import ReadableSpan
-from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult, SpanProcessor
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+    SpanProcessor,
+)
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 logger = logging.getLogger(__name__)
 
+# Matches filter patterns that are plain literals (escaped dots allowed), optionally
+# anchored with "^" and optionally ending in ".*" (a no-op under re.search)
+_LITERAL_FILTER_RE = re.compile(r"(\^?)((?:[\w\-]|\\\.)+)(?:\.\*)?")
+
+# agent.type values keyed on the first 4 characters of the span name; the span name
+# must still start with the full value so only names like "google_adk..." are tagged
+_AGENT_TYPE_BY_PREFIX: Dict[str, str] = {
+    "goog": "google_adk",
+    "lang": "langchain",
+}
+
+# Below this many literal substrings, repeated "in" checks beat building an automaton
+_AHOCORASICK_MIN_LITERALS = 8
+
+# Whether ReadableSpan allows replacing its parent context; None until the first attempt
+_REPARENT_SUPPORTED: Optional[bool] = None
+
+
+def static_resource_attributes() -> Dict[str, str]:
+    """Return attributes that are the same for every span, for use on the Resource.
+    
+    Resource attributes are exported with every span without being copied onto
+    each one. Call this after loading .env so the environment values are picked up.
+    
+    Returns:
+        Dict of resource attribute names to values
+    """
+    return {
+        "deployment.environment": os.getenv("ENVIRONMENT", "development"),
+        "service.version": os.getenv("SERVICE_VERSION", "1.0.0"),
+    }
+
 
 class TraceModifyingSpanProcessor(SpanProcessor):
     """Custom span processor that modifies spans when they end (before export).
@@ -27,35 +74,39 @@ class TraceModifyingSpanProcessor(SpanProcessor):
     - Add/modify/remove span attributes
     - Filter spans (by not adding them to the processor)
     - Add computed metadata based on span properties
+    
+    Attributes that don't depend on the span (environment, service version)
+    belong on the TracerProvider's Resource instead, see static_resource_attributes().
     """
     
     def on_end(self, span: ReadableSpan):
         """Called when a span ends. Modify the span here before it's exported."""
-        logger.debug(f"TraceModifyingSpanProcessor.on_end() called for span: {span.name}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("TraceModifyingSpanProcessor.on_end() called for span: %s", span.name)
         
         # ============================================================
         # CUSTOMIZE TRACE MODIFICATIONS HERE
         # ============================================================
         # Note: ReadableSpan allows attribute modification via _attributes dict
         # or by accessing the underlying span if it's still mutable
-        
-        # Example: Add environment information
-        span._attributes["deployment.environment"] = os.getenv("ENVIRONMENT", "development")
-        
-        # Example: Add service version
-        span._attributes["service.version"] = os.getenv("SERVICE_VERSION", "1.0.0")
+        attributes = span._attributes
         
         # Example: Add custom processor marker
-        span._attributes["custom.processor"] = "trace_modifier"
+        try:
+            attributes["custom.processor"] = "trace_modifier"
+        except TypeError:
+            # Newer SDKs freeze attributes once the span has ended; leave it as is
+            return
         
         # Example: Modify span attributes based on conditions
-        if span.name.startswith("google_adk"):
-            span._attributes["agent.type"] = "google_adk"
+        name = span.name
+        agent_type = _AGENT_TYPE_BY_PREFIX.get(name[:4])
+        if agent_type is not None and name.startswith(agent_type):
+            attributes["agent.type"] = agent_type
         
         # Example: Add computed attributes
-        if hasattr(span, 'end_time') and hasattr(span, 'start_time') and span.end_time and span.start_time:
-            duration_ns = span.end_time - span.start_time
-            span._attributes["duration_ms"] = duration_ns / 1_000_000
+        if span.end_time and span.start_time:
+            attributes["duration_ms"] = (span.end_time - span.start_time) / 1_000_000
         
         # Example: Filter spans (mark for filtering - actual filtering happens in exporter)
         # span._attributes["_filter"] = True
@@ -73,8 +124,123 @@ class TraceModifyingSpanProcessor(SpanProcessor):
         pass
     
     def force_flush(self, timeout_millis: int = 30000):
-        """Force flush the processor."""
-        pass
+        """Force flush the processor.
+        
+        Nothing is buffered here, but the TracerProvider stops flushing the
+        processors added after this one unless this returns True.
+        """
+        return True
+
+
+def compile_filter_patterns(patterns: Sequence[Union[str, re.Pattern]]) -> list[re.Pattern]:
+    """Compile regex filter patterns, skipping invalid ones.
+    
+    Args:
+        patterns: Regex pattern strings or already compiled patterns
+        
+    Returns:
+        List of compiled regex patterns
+    """
+    compiled = []
+    for pattern in patterns:
+        if isinstance(pattern, re.Pattern):
+            compiled.append(pattern)
+            continue
+        try:
+            compiled.append(re.compile(pattern))
+            logger.debug("Compiled filter pattern: %s", pattern)
+        except re.error as e:
+            logger.warning("Invalid regex pattern '%s': %s. Skipping.", pattern, e)
+    return compiled
+
+
+def combine_filter_patterns(patterns: Sequence[re.Pattern]) -> list[re.Pattern]:
+    """Union compiled patterns into as few regexes as possible.
+    
+    Plain patterns are joined into a single alternation regex. Patterns with flags
+    (inline like ``(?i)`` or passed to re.compile) or groups are kept separate:
+    joining them would move inline flags out of position, drop compile flags and
+    renumber the groups that backreferences point to.
+    
+    Args:
+        patterns: Compiled regex patterns
+        
+    Returns:
+        List of compiled patterns that together match the same names as the inputs
+    """
+    plain = []
+    separate = []
+    for pattern in patterns:
+        if pattern.flags & ~re.UNICODE or pattern.groups:
+            separate.append(pattern)
+        else:
+            plain.append(pattern)
+    if len(plain) > 1:
+        try:
+            plain = [re.compile("|".join(f"(?:{p.pattern})" for p in plain))]
+        except re.error as e:
+            logger.warning("Could not combine filter patterns (%s); matching them one by one", e)
+    return plain + separate
+
+
+def split_literal_filter_patterns(
+    patterns: Sequence[re.Pattern],
+) -> tuple[tuple[str, ...], tuple[str, ...], list[re.Pattern]]:
+    """Split out filter patterns that can be matched without the regex engine.
+    
+    Patterns like ``^a2a\\.server.*`` become literal prefixes checked with
+    ``str.startswith`` and unanchored ones like ``a2a\\.server.*`` become literal
+    substrings, which matches ``re.search`` semantics for both.
+    
+    Args:
+        patterns: Compiled regex patterns
+        
+    Returns:
+        Tuple of (literal prefixes, literal substrings, remaining regex patterns)
+    """
+    prefixes = []
+    substrings = []
+    regexes = []
+    for pattern in patterns:
+        match = _LITERAL_FILTER_RE.fullmatch(pattern.pattern)
+        if match is None or pattern.flags & ~re.UNICODE:
+            regexes.append(pattern)
+            continue
+        anchor, literal = match.groups()
+        literal = literal.replace("\\.", ".")
+        (prefixes if anchor else substrings).append(literal)
+        logger.debug("Using literal fast path for filter pattern: %s", pattern.pattern)
+    return tuple(prefixes), tuple(substrings), regexes
+
+
+def build_substring_matcher(substrings: Sequence[str]) -> Callable[[str], bool]:
+    """Build a function that checks whether a span name contains any literal substring.
+    
+    Large literal sets are scanned in a single pass with an Aho-Corasick automaton
+    when pyahocorasick is installed; otherwise each substring is checked in turn.
+    
+    Args:
+        substrings: Literal substrings to look for
+        
+    Returns:
+        Function taking a span name and returning True if any substring occurs in it
+    """
+    if not substrings:
+        return lambda name: False
+    if ahocorasick is not None and len(substrings) >= _AHOCORASICK_MIN_LITERALS:
+        automaton = ahocorasick.Automaton()
+        for literal in substrings:
+            automaton.add_word(literal, literal)
+        automaton.make_automaton()
+        logger.debug("Matching %d literal filter patterns with Aho-Corasick", len(substrings))
+        return lambda name: next(automaton.iter(name), None) is not None
+    return lambda name: any(literal in name for literal in substrings)
+
+
+@lru_cache(maxsize=32)
+def _combine_filter_patterns_cached(patterns: tuple[re.Pattern, ...]) -> list[re.Pattern]:
+    """Memoized combine_filter_patterns() so repeated calls reuse the same union."""
+    return combine_filter_patterns(patterns)
 
 
 def should_filter_span(span: ReadableSpan, filter_patterns: list[re.Pattern]) -> bool:
@@ -90,10 +256,12 @@ def should_filter_span(span: ReadableSpan, filter_patterns: list[re.Pattern]) ->
     if not filter_patterns:
         return False
     
+    # The patterns are combined once per distinct list, so each span name
+    # usually needs a single regex search
     span_name = span.name
-    for pattern in filter_patterns:
+    for pattern in _combine_filter_patterns_cached(tuple(filter_patterns)):
         if pattern.search(span_name):
-            logger.debug(f"Filtering out span '{span_name}' (matched pattern: {pattern.pattern})")
+            logger.debug("Filtering out span '%s' (matched pattern: %s)", span_name, pattern.pattern)
             return True
     
     return False
@@ -116,198 +284,122 @@ def restructure_trace_spans(
         filtered_span_ids: Set of span IDs that were filtered out
         
     Returns:
-        Sequence of restructured spans with updated parent contexts
+        kept_spans, with the parent contexts of reparented spans updated in place
     """
+    global _REPARENT_SUPPORTED
+    
     if not filtered_span_ids:
         return kept_spans
     
-    # Build maps for efficient lookup
-    # span_by_id: all spans (for parent chain traversal)
-    # kept_span_by_id: only kept spans (for reparenting)
-    span_by_id: Dict[int, ReadableSpan] = {}
-    kept_span_by_id: Dict[int, ReadableSpan] = {}
-    parent_map: Dict[int, int] = {}  # child_span_id -> parent_span_id
+    # Most batches only filter leaf spans; skip building the lookup maps when
+    # no kept span hangs directly off a filtered one
+    if not any(span.parent and span.parent.span_id in filtered_span_ids for span in kept_spans):
+        return kept_spans
+    
+    # Debug messages below format span IDs as hex, so skip them entirely when disabled
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
     
     # Build complete parent map from ALL spans (including filtered) for chain traversal
-    for span in all_spans:
-        span_id = span.context.span_id
-        span_by_id[span_id] = span
-        
-        # Get parent span ID from span context
-        parent_context = span.parent
-        if parent_context and parent_context.span_id:
-            parent_map[span_id] = parent_context.span_id
+    parent_map: Dict[int, int] = {  # child_span_id -> parent_span_id
+        span.context.span_id: span.parent.span_id
+        for span in all_spans
+        if span.parent and span.parent.span_id
+    }
     
-    # Build map of kept spans only (for reparenting)
-    for span in kept_spans:
-        kept_span_by_id[span.context.span_id] = span
+    # Build map of kept spans only; the ancestor search only needs their IDs,
+    # the span itself is fetched once a span is actually reparented onto it
+    kept_span_by_id: Dict[int, ReadableSpan] = {span.context.span_id: span for span in kept_spans}
+    kept_ids = kept_span_by_id.keys()
+    
+    # Nearest kept ancestor for each filtered span, shared by every kept span below it
+    ancestor_cache: Dict[int, Optional[int]] = {}
     
     # Find the nearest non-filtered ancestor for each span
     def find_nearest_non_filtered_ancestor(span_id: int) -> Optional[int]:
         """Find the nearest ancestor that wasn't filtered and exists in kept spans."""
+        path = []
         visited = set()
         current_id = parent_map.get(span_id)
+        nearest_id = None
         
         while current_id and current_id not in visited:
+            if current_id in ancestor_cache:
+                nearest_id = ancestor_cache[current_id]
+                break
+            # Kept spans are never filtered, so membership alone identifies a valid parent
+            if current_id in kept_ids:
+                nearest_id = current_id
+                break
             visited.add(current_id)
-            # Check if this ancestor is not filtered AND exists in kept spans
-            if current_id not in filtered_span_ids and current_id in kept_span_by_id:
-                return current_id
+            path.append(current_id)
             current_id = parent_map.get(current_id)
         
-        return None
+        # Every skipped ancestor on the way up resolves to the same kept span
+        for ancestor_id in path:
+            ancestor_cache[ancestor_id] = nearest_id
+        return nearest_id
     
     # Now restructure only the kept spans
-    # We need to process spans in multiple passes to handle nested reparenting
-    restructured_spans = list(kept_spans)
+    # The ancestor walk skips whole chains of filtered spans, so one pass is enough
     reparented_count = 0
-    max_iterations = 10  # Prevent infinite loops
-    iteration = 0
     
-    while iteration < max_iterations:
-        iteration += 1
-        spans_modified_this_iteration = 0
+    for span in kept_spans:
+        span_id = span.context.span_id
+        parent_context = span.parent
+        parent_id = parent_context.span_id if parent_context else None
         
-        for span in restructured_spans:
-            span_id = span.context.span_id
-            
-            # Get current parent from the span itself (may have been updated in previous iteration)
-            current_parent_context = span.parent
-            current_parent_id = current_parent_context.span_id if current_parent_context else None
-            
-            # Also check the original parent from parent_map
-            original_parent_id = parent_map.get(span_id)
-            
-            # Use current parent if available, otherwise use original
-            # If current parent is not filtered, we don't need to reparent
-            parent_id = current_parent_id or original_parent_id
-            
-            # Only reparent if the parent is filtered
-            if parent_id and parent_id in filtered_span_ids:
+        # Only reparent if the parent is filtered
+        if parent_id and parent_id in filtered_span_ids:
+            if debug_enabled:
                 logger.debug(
-                    f"[Iteration {iteration}] Span '{span.name}' (span_id={span_id:x}) has filtered parent "
-                    f"(span_id={parent_id:x}), finding new parent..."
+                    "Span '%s' (span_id=%x) has filtered parent (span_id=%x), finding new parent...",
+                    span.name, span_id, parent_id,
                 )
-                # Find nearest non-filtered ancestor
-                new_parent_id = find_nearest_non_filtered_ancestor(span_id)
+            # Find nearest non-filtered ancestor
+            new_parent_id = find_nearest_non_filtered_ancestor(span_id)
+            
+            if new_parent_id:
+                if debug_enabled:
+                    logger.debug("Found new parent for '%s': span_id=%x", span.name, new_parent_id)
+                # Reparent this span - the ancestor finder only returns kept span IDs
+                new_parent_span = kept_span_by_id[new_parent_id]
+                if debug_enabled:
+                    logger.debug(
+                        "Attempting to reparent '%s' to '%s' (span_id=%x)",
+                        span.name, new_parent_span.name, new_parent_id,
+                    )
+                new_parent_context = new_parent_span.context
+                if _REPARENT_SUPPORTED:
+                    span._parent = new_parent_context
+                    reparented = True
+                elif _REPARENT_SUPPORTED is None:
+                    # First attempt: find out whether ReadableSpan lets us replace _parent
+                    try:
+                        span._parent = new_parent_context
+                        reparented = _REPARENT_SUPPORTED = True
+                    except AttributeError as e:
+                        logger.warning("ReadableSpan parent context is immutable (%s); marking spans instead", e)
+                        reparented = _REPARENT_SUPPORTED = False
+                else:
+                    reparented = False
                 
-                if new_parent_id:
-                    logger.debug(f"Found new parent for '{span.name}': span_id={new_parent_id:x}")
-                    # Reparent this span - use kept_span_by_id to ensure it's a kept span
-                    new_parent_span = kept_span_by_id.get(new_parent_id)
-                    if new_parent_span:
+                if reparented:
+                    if debug_enabled:
                         logger.debug(
-                            f"Attempting to reparent '{span.name}' to '{new_parent_span.name}' "
-                            f"(span_id={new_parent_id:x})"
+                            "✓ Reparented '%s' (span_id=%x) to '%s' (span_id=%x)",
+                            span.name, span_id, new_parent_span.name, new_parent_id,
                         )
-                    else:
-                        logger.warning(
-                            f"Found parent span_id={new_parent_id:x} for '{span.name}' but it's not in kept spans. "
-                            f"This shouldn't happen - the ancestor finder should only return kept spans."
-                        )
-                        continue  # Skip reparenting for this span
-                    # Try to modify the parent through internal SDK structures
-                    # ReadableSpan wraps a Span object - try to access and modify it
-                    reparented = False
-                    
-                    # Method 1: Try accessing _parent attribute directly (most common)
-                    if hasattr(span, '_parent'):
-                        try:
-                            old_parent = span._parent
-                            span._parent = new_parent_span.context
-                            reparented = True
-                            logger.info(
-                                f"✓ Reparented '{span.name}' via _parent: "
-                                f"old_parent={old_parent.span_id:x if old_parent else None}, "
-                                f"new_parent={new_parent_span.context.span_id:x}"
-                            )
-                        except (AttributeError, TypeError, ValueError) as e:
-                            logger.debug(f"Could not modify _parent: {e}")
-                    
-                    # Method 2: Try accessing underlying span object (_span or _readable_span)
-                    if not reparented:
-                        for attr_name in ['_span', '_readable_span', 'span']:
-                            if hasattr(span, attr_name):
-                                try:
-                                    underlying_span = getattr(span, attr_name)
-                                    if hasattr(underlying_span, 'parent'):
-                                        underlying_span.parent = new_parent_span.context
-                                        reparented = True
-                                        logger.debug(f"Successfully reparented via {attr_name}.parent")
-                                        break
-                                    elif hasattr(underlying_span, '_parent'):
-                                        underlying_span._parent = new_parent_span.context
-                                        reparented = True
-                                        logger.debug(f"Successfully reparented via {attr_name}._parent")
-                                        break
-                                except (AttributeError, TypeError, ValueError) as e:
-                                    logger.debug(f"Could not modify {attr_name}: {e}")
-                                    continue
-                    
-                    if reparented:
-                        reparented_count += 1
-                        spans_modified_this_iteration += 1
-                        # Verify the reparenting worked
-                        current_parent = span.parent
-                        if current_parent and current_parent.span_id == new_parent_span.context.span_id:
-                            logger.info(
-                                f"✓ Successfully reparented '{span.name}' (span_id={span_id:x}) "
-                                f"to '{new_parent_span.name}' (span_id={new_parent_id:x})"
-                            )
-                            # Update parent_map for this span so children can find it
-                            parent_map[span_id] = new_parent_id
-                        else:
-                            logger.warning(
-                                f"⚠ Reparenting attempt for '{span.name}' may have failed. "
-                                f"Current parent span_id: {current_parent.span_id:x if current_parent else None}, "
-                                f"Expected: {new_parent_id:x}"
-                            )
-                    else:
-                        # Fallback: Use span links to indicate the new parent relationship
-                        # This helps LangSmith understand the restructured trace
-                        try:
-                            # Add a link to the new parent span
-                            from opentelemetry.trace import Link
-                            from opentelemetry.trace.span import TraceState
-                            
-                            # Try to add link through internal structure
-                            if hasattr(span, '_links'):
-                                link = Link(new_parent_span.context)
-                                if isinstance(span._links, list):
-                                    span._links.append(link)
-                                reparented_count += 1
-                                spans_modified_this_iteration += 1
-                                parent_map[span_id] = new_parent_id  # Update parent_map
-                                logger.debug(
-                                    f"Added link to new parent for span '{span.name}' "
-                                    f"(span_id={span_id:x}) -> parent '{new_parent_span.name}' "
-                                    f"(span_id={new_parent_id:x})"
-                                )
-                            else:
-                                # Last resort: add metadata attributes
-                                span._attributes["_reparented_from"] = f"span_id:{parent_id:x}"
-                                span._attributes["_reparented_to"] = f"span_id:{new_parent_id:x}"
-                                span._attributes["_reparented_to_name"] = new_parent_span.name
-                                reparented_count += 1
-                                spans_modified_this_iteration += 1
-                                parent_map[span_id] = new_parent_id  # Update parent_map
-                                logger.debug(
-                                    f"Marked span '{span.name}' for reparenting via attributes "
-                                    f"(from span_id={parent_id:x} to span_id={new_parent_id:x})"
-                                )
-                        except Exception as e:
-                            logger.warning(
-                                f"Could not reparent span '{span.name}': {e}. "
-                                f"Span may appear orphaned in LangSmith."
-                            )
-        
-        # If no spans were modified this iteration, we're done
-        if spans_modified_this_iteration == 0:
-            logger.debug(f"No more spans to reparent after {iteration} iteration(s)")
-            break
+                else:
+                    # Fallback: record the new parent as attributes so the relationship isn't lost
+                    span._attributes["_reparented_from"] = f"span_id:{parent_id:x}"
+                    span._attributes["_reparented_to"] = f"span_id:{new_parent_id:x}"
+                    span._attributes["_reparented_to_name"] = new_parent_span.name
+                reparented_count += 1
+                # Update parent_map for this span so children can find it
+                parent_map[span_id] = new_parent_id
     
     if reparented_count > 0:
-        logger.info(f"Reparented {reparented_count} span(s) after filtering in {iteration} iteration(s)")
+        logger.info("Reparented %d span(s) after filtering", reparented_count)
     else:
         logger.warning(
             "⚠ No spans were successfully reparented. "
@@ -316,17 +408,20 @@ def restructure_trace_spans(
         )
     
     # Log final span structure for debugging
-    logger.info("Final span structure after restructuring:")
-    for span in restructured_spans:
-        parent_context = span.parent
-        if parent_context:
-            parent_span = span_by_id.get(parent_context.span_id)
-            parent_name = parent_span.name if parent_span else f"span_id={parent_context.span_id:x}"
-            logger.info(f"  - {span.name} → parent: {parent_name}")
-        else:
-            logger.info(f"  - {span.name} → root")
+    if debug_enabled:
+        name_by_id = {span.context.span_id: span.name for span in all_spans}
+        logger.debug("Final span structure after restructuring:")
+        for span in kept_spans:
+            parent_context = span.parent
+            if parent_context:
+                parent_name = name_by_id.get(
+                    parent_context.span_id, f"span_id={parent_context.span_id:x}"
+                )
+                logger.debug("  - %s → parent: %s", span.name, parent_name)
+            else:
+                logger.debug("  - %s → root", span.name)
     
-    return restructured_spans
+    return kept_spans
 
 
 class ModifyingSpanExporter(SpanExporter):
@@ -336,111 +431,114 @@ class ModifyingSpanExporter(SpanExporter):
     This exporter is mainly for filtering or logging.
     """
     
-    def __init__(self, base_exporter: SpanExporter, filter_patterns: list[str] = None):
+    def __init__(
+        self,
+        base_exporter: SpanExporter,
+        filter_patterns: Sequence[Union[str, re.Pattern]] = None,
+        filter_cache_size: int = 2048,
+    ):
         """Initialize with a base exporter to wrap.
         
         Args:
             base_exporter: The base exporter to wrap
-            filter_patterns: List of regex pattern strings to filter spans by name
+            filter_patterns: Regex patterns (strings or precompiled) to filter spans by name
+            filter_cache_size: Maximum number of span names whose filter decision is cached
         """
         self.base_exporter = base_exporter
-        self.filter_patterns = self._compile_filter_patterns(filter_patterns or [])
-        # Reparenting is controlled by environment variable (checked in export method)
+        self.filter_patterns = compile_filter_patterns(filter_patterns or [])
+        # Literal patterns skip the regex engine; the rest are unioned where that's
+        # safe so each span name needs as few regex searches as possible
+        self._filter_prefixes, filter_substrings, regex_patterns = (
+            split_literal_filter_patterns(self.filter_patterns)
+        )
+        self._contains_filter_substring = build_substring_matcher(filter_substrings)
+        self._regex_patterns = combine_filter_patterns(regex_patterns)
+        # Span names are low-cardinality, so memoize filter decisions by name
+        self._is_filtered = lru_cache(maxsize=filter_cache_size)(self._match_span_name)
+        # Reparenting is controlled by environment variable, resolved once here rather
+        # than at import so values loaded from .env after importing this module apply
+        self._reparent_enabled = os.getenv("OTEL_SPAN_REPARENT_ENABLED", "true").lower() in ("true", "1", "yes")
     
-    @staticmethod
-    def _compile_filter_patterns(pattern_strings: list[str]) -> list[re.Pattern]:
-        """Compile regex patterns from string list.
-        
-        Args:
-            pattern_strings: List of regex pattern strings
-            
-        Returns:
-            List of compiled regex patterns
-        """
-        patterns = []
-        for pattern_str in pattern_strings:
-            try:
-                pattern = re.compile(pattern_str)
-                patterns.append(pattern)
-                logger.debug(f"Compiled filter pattern: {pattern_str}")
-            except re.error as e:
-                logger.warning(f"Invalid regex pattern '{pattern_str}': {e}. Skipping.")
-        return patterns
+    def _match_span_name(self, name: str) -> bool:
+        """Return True if the span name matches any filter pattern."""
+        if not (
+            name.startswith(self._filter_prefixes)
+            or self._contains_filter_substring(name)
+            or any(pattern.search(name) for pattern in self._regex_patterns)
+        ):
+            return False
+        logger.debug("Filtering out span '%s'", name)
+        return True
     
     def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
         """Export spans to LangSmith, filtering out unwanted spans and optionally restructuring the trace."""
-        logger.info(f"ModifyingSpanExporter.export() called with {len(spans)} span(s)")
+        logger.info("ModifyingSpanExporter.export() called with %d span(s)", len(spans))
         
         # Step 1: Identify which spans to filter
         filtered_span_ids = set()
         spans_to_keep = []
         
         for span in spans:
-            if should_filter_span(span, self.filter_patterns):
+            if self._is_filtered(span.name):
                 filtered_span_ids.add(span.context.span_id)
-                logger.debug(f"Marking span for filtering: name={span.name}, span_id={span.context.span_id:x}")
             else:
                 spans_to_keep.append(span)
-                logger.debug(f"Keeping span: name={span.name}, span_id={span.context.span_id:x}")
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            for span in spans:
+                span_id = span.context.span_id
+                action = "Marking span for filtering" if span_id in filtered_span_ids else "Keeping span"
+                logger.debug("%s: name=%s, span_id=%x", action, span.name, span_id)
         
         if not filtered_span_ids:
             # No filtering needed, export as-is
-            logger.info(f"Exporting {len(spans_to_keep)} span(s) to LangSmith")
+            logger.info("Exporting %d span(s) to LangSmith", len(spans_to_keep))
             return self._export_spans(spans_to_keep)
         
-        # Check if reparenting is enabled
-        reparent_enabled = os.getenv("OTEL_SPAN_REPARENT_ENABLED", "true").lower() in ("true", "1", "yes")
-        
-        if not reparent_enabled:
+        if not self._reparent_enabled:
             # Step 2a: Filter out descendants of filtered spans (no reparenting)
-            logger.info(f"Reparenting disabled. Filtering out {len(filtered_span_ids)} span(s) and their descendants...")
+            logger.info("Reparenting disabled. Filtering out %d span(s) and their descendants...", len(filtered_span_ids))
             
             # Build parent map to find descendants
-            parent_map: Dict[int, int] = {}  # child_span_id -> parent_span_id
-            span_by_id: Dict[int, ReadableSpan] = {}
+            parent_map: Dict[int, int] = {  # child_span_id -> parent_span_id
+                span.context.span_id: span.parent.span_id
+                for span in spans
+                if span.parent and span.parent.span_id
+            }
             
-            for span in spans:
-                span_id = span.context.span_id
-                span_by_id[span_id] = span
-                parent_context = span.parent
-                if parent_context and parent_context.span_id:
-                    parent_map[span_id] = parent_context.span_id
+            # Build child lists once, then walk down from the filtered spans
+            children: Dict[int, list[int]] = {}
+            for child_id, parent_id in parent_map.items():
+                children.setdefault(parent_id, []).append(child_id)
             
             # Find all descendants of filtered spans
             descendants_to_filter = set(filtered_span_ids)
-            for span_id in filtered_span_ids:
-                # Find all children (spans whose parent is this filtered span)
-                for child_id, parent_id in parent_map.items():
-                    if parent_id == span_id:
-                        # Recursively add all descendants
+            stack = list(filtered_span_ids)
+            while stack:
+                for child_id in children.get(stack.pop(), ()):
+                    if child_id not in descendants_to_filter:
                         descendants_to_filter.add(child_id)
-                        # Find children of this child
-                        stack = [child_id]
-                        while stack:
-                            current_id = stack.pop()
-                            for cid, pid in parent_map.items():
-                                if pid == current_id and cid not in descendants_to_filter:
-                                    descendants_to_filter.add(cid)
-                                    stack.append(cid)
+                        stack.append(child_id)
             
             # Filter out all descendants
-            final_spans = []
-            for span in spans_to_keep:
-                if span.context.span_id not in descendants_to_filter:
-                    final_spans.append(span)
-                else:
-                    logger.debug(f"Filtering out descendant: name={span.name}, span_id={span.context.span_id:x}")
+            final_spans = [
+                span for span in spans_to_keep
+                if span.context.span_id not in descendants_to_filter
+            ]
             
-            filtered_count = len(filtered_span_ids) + len(descendants_to_filter - filtered_span_ids)
-            logger.info(f"Filtered out {filtered_count} span(s) (including {len(descendants_to_filter - filtered_span_ids)} descendants), exporting {len(final_spans)} span(s) to LangSmith")
+            descendant_count = len(descendants_to_filter) - len(filtered_span_ids)
+            logger.info(
+                "Filtered out %d span(s) (including %d descendants), exporting %d span(s) to LangSmith",
+                len(descendants_to_filter), descendant_count, len(final_spans),
+            )
             return self._export_spans(final_spans)
         
         # Step 2b: Restructure trace by reparenting spans whose parents were filtered
         # Pass ALL spans (including filtered) to build complete parent map
-        logger.info(f"Reparenting enabled. Filtered out {len(filtered_span_ids)} span(s), restructuring trace...")
+        logger.info("Reparenting enabled. Filtered out %d span(s), restructuring trace...", len(filtered_span_ids))
         restructured_spans = restructure_trace_spans(spans, spans_to_keep, filtered_span_ids)
         
-        logger.info(f"Exporting {len(restructured_spans)} restructured span(s) to LangSmith")
+        logger.info("Exporting %d restructured span(s) to LangSmith", len(restructured_spans))
         return self._export_spans(restructured_spans)
     
     def _export_spans(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
@@ -454,7 +552,7 @@ class ModifyingSpanExporter(SpanExporter):
                 logger.error("Failed to export spans to LangSmith")
             return result
         except Exception as e:
-            logger.error(f"Exception during span export: {e}", exc_info=True)
+            logger.error("Exception during span export: %s", e, exc_info=True)
             return SpanExportResult.FAILURE
     
     def shutdown(self):
@@ -464,3 +562,150 @@ class ModifyingSpanExporter(SpanExporter):
     def force_flush(self, timeout_millis: int = 30000):
         """Force flush the exporter."""
         return self.base_exporter.force_flush(timeout_millis)
+
+
+class ConcurrentSpanExporter(SpanExporter):
+    """Wrapper exporter that exports several span batches in parallel.
+    
+    BatchSpanProcessor waits for each export() call to finish before sending the
+    next batch, so a slow LangSmith endpoint backs up the whole span queue. This
+    wrapper hands each batch to a thread pool and returns immediately, allowing up
+    to ``max_concurrent_exports`` batches in flight. When every slot is busy,
+    export() blocks until one frees up, which keeps backpressure on the queue.
+    
+    The whole wrapped export (filtering, restructuring and the HTTP upload when
+    wrapping ModifyingSpanExporter) runs on the pool threads, so neither request
+    threads nor the BatchSpanProcessor worker ever do that work.
+    
+    Note: export() reports success once a batch is scheduled; failures of the
+    wrapped exporter are logged when the batch completes.
+    """
+    
+    def __init__(self, base_exporter: SpanExporter, max_concurrent_exports: int = 4):
+        """Initialize with a base exporter to wrap.
+        
+        Args:
+            base_exporter: The base exporter to wrap
+            max_concurrent_exports: Maximum number of batches exported at the same time
+        """
+        self.base_exporter = base_exporter
+        self._slots = threading.BoundedSemaphore(max_concurrent_exports)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrent_exports,
+            thread_name_prefix="span-export",
+        )
+        self._pending: set[Future] = set()
+        self._lock = threading.Lock()
+    
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        """Schedule a batch for export, blocking only while all slots are busy."""
+        self._slots.acquire()
+        try:
+            # Copy the batch - the caller may reuse its sequence once we return.
+            # Run in a copy of the caller's context so the instrumentation suppression
+            # set around export() still applies and the upload isn't traced itself
+            future = self._executor.submit(
+                contextvars.copy_context().run, self.base_exporter.export, list(spans)
+            )
+        except RuntimeError as e:
+            # Executor already shut down
+            self._slots.release()
+            logger.error("Cannot export spans after shutdown: %s", e)
+            return SpanExportResult.FAILURE
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._on_export_done)
+        return SpanExportResult.SUCCESS
+    
+    def _on_export_done(self, future: Future):
+        """Release the export slot and log the outcome of a finished batch."""
+        self._slots.release()
+        with self._lock:
+            self._pending.discard(future)
+        exception = future.exception()
+        if exception is not None:
+            logger.error("Exception during concurrent span export: %s", exception)
+        elif future.result() == SpanExportResult.FAILURE:
+            logger.error("Concurrent span export failed")
+    
+    def shutdown(self):
+        """Wait for in-flight exports, then shutdown the wrapped exporter."""
+        self._executor.shutdown(wait=True)
+        return self.base_exporter.shutdown()
+    
+    def force_flush(self, timeout_millis: int = 30000):
+        """Wait for in-flight exports, then force flush the wrapped exporter."""
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout_millis / 1000)
+        if not_done:
+            logger.warning("%d span export(s) still in flight after force_flush timeout", len(not_done))
+            return False
+        return self.base_exporter.force_flush(timeout_millis)
+
+
+class FlushingBatchSpanProcessor(BatchSpanProcessor):
+    """BatchSpanProcessor whose force_flush() also waits for its exporter.
+    
+    BatchSpanProcessor.force_flush() only hands the queued spans to the exporter.
+    With ConcurrentSpanExporter those batches are still uploading in the background
+    at that point, so the exporter is flushed as well before reporting success.
+    """
+    
+    def __init__(self, span_exporter: SpanExporter, **kwargs):
+        """Initialize with the exporter to batch spans into.
+        
+        Args:
+            span_exporter: The exporter to send batches to
+            **kwargs: Batch settings passed through to BatchSpanProcessor
+        """
+        super().__init__(span_exporter, **kwargs)
+        self._flush_exporter = span_exporter
+    
+    def force_flush(self, timeout_millis: Optional[int] = None) -> bool:
+        """Export all queued spans and wait for in-flight exports to finish."""
+        if not super().force_flush(timeout_millis):
+            return False
+        return self._flush_exporter.force_flush(timeout_millis or 30000)
+
+
+def build_batch_span_processor(
+    base_exporter: SpanExporter,
+    filter_patterns: Sequence[Union[str, re.Pattern]] = None,
+    filter_cache_size: int = 2048,
+    max_concurrent_exports: int = 4,
+) -> BatchSpanProcessor:
+    """Build the batching export pipeline around a base exporter.
+    
+    Spans flow FlushingBatchSpanProcessor -> ConcurrentSpanExporter ->
+    ModifyingSpanExporter -> base exporter. Batch settings are read from the standard OTEL_BSP_*
+    environment variables, with defaults sized for bursty A2A traffic: a larger
+    queue absorbs bursts, a short delay keeps traces visible quickly, and smaller
+    batches keep OTLP payloads light.
+    
+    Args:
+        base_exporter: The exporter that sends spans to LangSmith
+        filter_patterns: Regex patterns (strings or precompiled) to filter spans by name
+        filter_cache_size: Maximum number of span names whose filter decision is cached
+        max_concurrent_exports: Maximum number of batches exported at the same time
+        
+    Returns:
+        A BatchSpanProcessor ready to add to a TracerProvider
+    """
+    logger.info("Wrapping exporter with ModifyingSpanExporter...")
+    modifying_exporter = ModifyingSpanExporter(
+        base_exporter,
+        filter_patterns=filter_patterns,
+        filter_cache_size=filter_cache_size,
+    )
+    concurrent_exporter = ConcurrentSpanExporter(
+        modifying_exporter,
+        max_concurrent_exports=max_concurrent_exports,
+    )
+    return FlushingBatchSpanProcessor(
+        concurrent_exporter,
+        max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")),
+        schedule_delay_millis=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000")),
+        max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "256")),
+        export_timeout_millis=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "10000")),
+    )
@@ -0,0 +1,50 @@
+"""Helpers for reading tracing metadata from incoming A2A JSON-RPC requests."""
+
+import logging
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+logger = logging.getLogger(__name__)
+
+# Request bodies larger than this are not inspected for a thread_id
+MAX_THREAD_ID_BODY_BYTES = 1_000_000
+
+
+async def extract_thread_id(request):
+    """Return the thread_id from a JSON-RPC request's top-level metadata, if present.
+
+    The body is replayed to downstream handlers after it has been read.
+
+    Args:
+        request: The incoming Starlette/FastAPI request
+
+    Returns:
+        The value of body["metadata"]["thread_id"], or None if it isn't there
+    """
+    if (
+        request.method != "POST"
+        or not request.headers.get("content-type", "").startswith("application/json")
+    ):
+        return None
+
+    try:
+        if int(request.headers.get("content-length", "0")) > MAX_THREAD_ID_BODY_BYTES:
+            return None
+        body_bytes = await request.body()
+        if not body_bytes:
+            return None
+
+        async def receive():
+            return {"type": "http.request", "body": body_bytes}
+        request._receive = receive
+
+        body = json_loads(body_bytes)
+        if "metadata" in body:
+            return body["metadata"].get("thread_id")
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        # Malformed header or body - trace the request without a thread_id
+        logger.debug("Could not extract thread_id from request: %s", e)
+    return None
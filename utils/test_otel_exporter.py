@@ -0,0 +1,99 @@
+"""Tests for span name filtering in the custom OpenTelemetry exporter."""
+
+import re
+import time
+
+from opentelemetry import context
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from utils.otel_exporter import (
+    ModifyingSpanExporter,
+    TraceModifyingSpanProcessor,
+    build_batch_span_processor,
+    combine_filter_patterns,
+    should_filter_span,
+)
+
+
+def is_filtered(patterns, name):
+    """Return whether an exporter built with the given patterns filters a span name."""
+    exporter = ModifyingSpanExporter(InMemorySpanExporter(), filter_patterns=patterns)
+    return exporter._is_filtered(name)
+
+
+def test_literal_patterns():
+    patterns = ["a2a\\.server.*", "^a2a\\.utils.*"]
+    assert is_filtered(patterns, "a2a.server.request_handler")
+    assert is_filtered(patterns, "a2a.utils.telemetry")
+    assert not is_filtered(patterns, "google_adk_agent")
+
+
+def test_inline_flag_pattern():
+    patterns = ["a2a\\.server.*", "(?i)eventqueue.*", ".*\\.enqueue_event"]
+    assert is_filtered(patterns, "EventQueue.dequeue")
+    assert is_filtered(patterns, "queue.enqueue_event")
+    assert not is_filtered(patterns, "google_adk_agent")
+
+
+def test_precompiled_pattern_keeps_flags():
+    assert is_filtered([re.compile("foo", re.IGNORECASE), "bar$"], "FOO")
+
+
+def test_backreference_pattern():
+    patterns = ["bar$", "(a)\\1"]
+    assert is_filtered(patterns, "xaa")
+    assert not is_filtered(patterns, "xab")
+
+
+def test_plain_patterns_are_combined():
+    patterns = [re.compile("foo$"), re.compile("^bar"), re.compile("(?i)baz")]
+    combined = combine_filter_patterns(patterns)
+    assert len(combined) == 2
+    assert combined[1] is patterns[2]
+
+
+def test_should_filter_span_accepts_pattern_list():
+    span = ReadableSpan(name="EventQueue.dequeue")
+    patterns = [re.compile("a2a\\.server.*"), re.compile("(?i)eventqueue.*")]
+    assert should_filter_span(span, patterns)
+    assert not should_filter_span(span, patterns[:1])
+    assert not should_filter_span(span, [])
+
+
+class SlowExporter(SpanExporter):
+    """Exporter that takes a while and records the context it ran in."""
+    
+    def __init__(self):
+        self.exports = []
+    
+    def export(self, spans):
+        time.sleep(0.2)
+        suppressed = context.get_value(context._SUPPRESS_INSTRUMENTATION_KEY)
+        self.exports.append((len(spans), suppressed))
+        return SpanExportResult.SUCCESS
+
+
+def test_force_flush_waits_for_concurrent_export():
+    exporter = SlowExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(build_batch_span_processor(exporter))
+    with provider.get_tracer(__name__).start_as_current_span("root"):
+        pass
+    provider.force_flush()
+    # The upload ran to completion with instrumentation still suppressed
+    assert exporter.exports == [(1, True)]
+    provider.shutdown()
+
+
+def test_modifying_processor_does_not_block_flush():
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(TraceModifyingSpanProcessor())
+    provider.add_span_processor(build_batch_span_processor(exporter))
+    with provider.get_tracer(__name__).start_as_current_span("google_adk_agent"):
+        pass
+    assert provider.force_flush()
+    assert len(exporter.get_finished_spans()) == 1
+    provider.shutdown()
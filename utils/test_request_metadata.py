@@ -0,0 +1,58 @@
+"""Tests for reading the thread_id from incoming A2A requests."""
+
+import asyncio
+import json
+
+from utils.request_metadata import MAX_THREAD_ID_BODY_BYTES, extract_thread_id
+
+
+class FakeRequest:
+    """Minimal stand-in for a Starlette request with a buffered body."""
+
+    def __init__(self, body, method="POST", content_type="application/json", content_length=None):
+        self.method = method
+        self.headers = {
+            "content-type": content_type,
+            "content-length": str(len(body) if content_length is None else content_length),
+        }
+        self._body = body
+        self._receive = None
+
+    async def body(self):
+        return self._body
+
+
+def extract(payload, **kwargs):
+    """Run extract_thread_id on a request carrying the given payload."""
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    request = FakeRequest(body, **kwargs)
+    return asyncio.run(extract_thread_id(request)), request
+
+
+def test_reads_top_level_metadata():
+    thread_id, request = extract({"jsonrpc": "2.0", "metadata": {"thread_id": "abc"}})
+    assert thread_id == "abc"
+    # The body is replayed to the downstream handler
+    message = asyncio.run(request._receive())
+    assert json.loads(message["body"]) == {"jsonrpc": "2.0", "metadata": {"thread_id": "abc"}}
+
+
+def test_ignores_nested_metadata():
+    payload = {
+        "params": {"message": {"metadata": {"thread_id": "nested"}}},
+        "metadata": {"thread_id": "top"},
+    }
+    assert extract(payload)[0] == "top"
+    assert extract({"params": {"metadata": {"thread_id": "nested"}}})[0] is None
+
+
+def test_skips_non_json_and_oversized_requests():
+    payload = {"metadata": {"thread_id": "abc"}}
+    assert extract(payload, method="GET")[0] is None
+    assert extract(payload, content_type="text/plain")[0] is None
+    assert extract(payload, content_length=MAX_THREAD_ID_BODY_BYTES + 1)[0] is None
+
+
+def test_malformed_body():
+    assert extract(b"{not json")[0] is None
+    assert extract({"metadata": "not a dict"})[0] is None